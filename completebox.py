@@ -1,13 +1,26 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
+import asyncio
+import atexit
+import heapq
+import os
+import select
 import shlex
+import signal
+import string
 import subprocess
-from typing import Callable, Iterable, Optional
+import threading
+import time
+from bisect import bisect_left
+from functools import lru_cache
+from itertools import chain
+from typing import Callable, Iterable, Iterator, Optional, Tuple
 
 from prompt_toolkit import Application
 from prompt_toolkit.formatted_text import FormattedText
 from prompt_toolkit.key_binding import KeyBindings
+from prompt_toolkit.keys import Keys
 from prompt_toolkit.layout import Layout
 from prompt_toolkit.layout.containers import Window
 from prompt_toolkit.layout.controls import FormattedTextControl
@@ -25,6 +38,8 @@ DEFAULT_CHOICES = [
     "com.tiktok",
 ]
 
+_ALLOWED_CHARS = frozenset(string.ascii_letters + string.digits + ".-_" + " ")
+
 DEFAULT_STYLE = Style.from_dict({
     "prompt": "ansicyan bold",
     "input": "ansicyan",
@@ -38,40 +53,253 @@ DEFAULT_STYLE = Style.from_dict({
 
 
 def _split_completion_query(text: str) -> tuple[str, str]:
-    if not text:
-        return "", ""
-    if text.endswith(" "):
-        return text, ""
     head, sep, tail = text.rpartition(" ")
-    if sep:
-        return head + sep, tail
-    return "", text
+    if not sep:
+        return "", text
+    return head + sep, tail
 
 
-def bash_completer(query: str) -> list[str]:
-    lead, fragment = _split_completion_query(query)
+@lru_cache(maxsize=256)
+def _truncate(text: str, width: int) -> str:
+    if width <= 0:
+        return ""
+    if len(text) <= width:
+        return text
+    if width == 1:
+        return "…"
+    return text[: width - 1] + "…"
+
+
+def _all_tokens_matcher(tokens: list[str]) -> Callable[[str], bool]:
+    wanted = set(tokens)
+    return lambda text: all(token in text for token in wanted)
+
+
+_Entry = Tuple[int, str, str]
+
+_NUMPY_MIN_CHOICES = 512
+
+
+@lru_cache(maxsize=None)
+def _numpy():
     try:
-        result = subprocess.run(
-            ["bash", "-ic", f"compgen -cdfa -- {shlex.quote(fragment)}"],
-            capture_output=True,
-            text=True,
-            check=False,
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+_ROW_CACHE_SIZE = 64
+_FILTER_DEBOUNCE = 0.03
+
+
+class _ChoiceIndex:
+    __slots__ = ("choices", "entries", "_array", "_prefix_keys", "_prefix_positions")
+
+    def __init__(self, choices: Iterable[str]) -> None:
+        self.choices = list(choices)
+        self.entries: list[_Entry] = [
+            (position, choice.lower(), choice) for position, choice in enumerate(self.choices)
+        ]
+        self._array = None
+        self._prefix_keys: Optional[list[str]] = None
+        self._prefix_positions: list[int] = []
+
+    def prefix_positions(self, prefix: str, limit: Optional[int]) -> tuple[list[int], int]:
+        if self._prefix_keys is None:
+            ordered = sorted((lowered, position) for position, lowered, _ in self.entries)
+            self._prefix_keys = [lowered for lowered, _ in ordered]
+            self._prefix_positions = [position for _, position in ordered]
+        lo = bisect_left(self._prefix_keys, prefix)
+        hi = bisect_left(self._prefix_keys, prefix + "\U0010ffff", lo)
+        positions = self._prefix_positions[lo:hi]
+        if limit is not None and len(positions) > limit:
+            return heapq.nsmallest(limit, positions), len(positions)
+        positions.sort()
+        return positions, len(positions)
+
+    def substring_hits(self, tokens: list[str]) -> Optional[list[_Entry]]:
+        if len(self.entries) < _NUMPY_MIN_CHOICES:
+            return None
+        np = _numpy()
+        if np is None:
+            return None
+        if self._array is None:
+            self._array = np.array([lowered for _, lowered, _ in self.entries], dtype=np.str_)
+        mask = np.char.find(self._array, tokens[0]) >= 0
+        for token in tokens[1:]:
+            mask &= np.char.find(self._array, token) >= 0
+        return [self.entries[i] for i in np.flatnonzero(mask)]
+
+
+_BASH_SENTINEL = "__completebox_end__"
+_BASH_PROC: Optional[subprocess.Popen] = None
+_BASH_LOCK = threading.Lock()
+_BASH_STARTUP_TIMEOUT = 5.0
+_BASH_TIMEOUT = 2.0
+_BASH_RESPAWNS = 1
+_BASH_FAILURES = 0
+_COMPGEN_LIMIT = 256
+
+
+def _kill_session(proc: subprocess.Popen) -> None:
+    if proc.poll() is None:
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except OSError:
+            proc.kill()
+        proc.wait()
+    for pipe in (proc.stdin, proc.stdout):
+        if pipe is not None:
+            try:
+                pipe.close()
+            except OSError:
+                pass
+
+
+def _close_bash() -> None:
+    proc = _BASH_PROC
+    if proc is None or proc.poll() is not None:
+        return
+    try:
+        proc.stdin.close()
+        proc.wait(timeout=1)
+    except (OSError, subprocess.TimeoutExpired):
+        _kill_session(proc)
+    else:
+        proc.stdout.close()
+
+
+atexit.register(_close_bash)
+
+
+def _discard_bash() -> None:
+    global _BASH_PROC, _BASH_FAILURES
+    if _BASH_PROC is None:
+        return
+    _kill_session(_BASH_PROC)
+    _BASH_FAILURES += 1
+    if _BASH_FAILURES <= _BASH_RESPAWNS:
+        _BASH_PROC = None
+
+
+def _iter_lines(fd: int, timeout: float) -> Iterator[bytes]:
+    deadline = time.monotonic() + timeout
+    pending = b""
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not select.select([fd], [], [], remaining)[0]:
+            raise TimeoutError
+        chunk = os.read(fd, 65536)
+        if not chunk:
+            return
+        *lines, pending = (pending + chunk).split(b"\n")
+        yield from lines
+
+
+def _read_until_sentinel(
+    proc: subprocess.Popen,
+    limit: int,
+    timeout: float,
+) -> Optional[list[str]]:
+    sentinel = _BASH_SENTINEL.encode()
+    candidates: dict[str, None] = {}
+    try:
+        for line in _iter_lines(proc.stdout.fileno(), timeout):
+            if line == sentinel:
+                return list(candidates)
+            if line and len(candidates) < limit:
+                candidates[os.fsdecode(line)] = None
+    except TimeoutError:
+        pass
+    return None
+
+
+def _bash_coprocess() -> Optional[subprocess.Popen]:
+    global _BASH_PROC
+    if _BASH_PROC is None:
+        try:
+            _BASH_PROC = subprocess.Popen(
+                ["bash", "-i"],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                bufsize=0,
+                start_new_session=True,
+            )
+        except FileNotFoundError:
+            return None
+        try:
+            _BASH_PROC.stdin.write(
+                f"unset HISTFILE; set +o history; echo; echo {_BASH_SENTINEL}\n".encode()
+            )
+        except OSError:
+            _discard_bash()
+            return None
+        if _read_until_sentinel(_BASH_PROC, 0, _BASH_STARTUP_TIMEOUT) is None:
+            _discard_bash()
+            return None
+    if _BASH_PROC.poll() is not None:
+        return None
+    return _BASH_PROC
+
+
+def _compgen(command: str, limit: int) -> Optional[list[str]]:
+    with _BASH_LOCK:
+        proc = _bash_coprocess()
+        if proc is None:
+            return None
+        try:
+            proc.stdin.write(f"{command}; echo; echo {_BASH_SENTINEL}\n".encode())
+        except OSError:
+            _discard_bash()
+            return None
+        lines = _read_until_sentinel(proc, limit, _BASH_TIMEOUT)
+        if lines is None:
+            _discard_bash()
+        return lines
+
+
+@lru_cache(maxsize=512)
+def _compgen_raw(fragment: str) -> tuple[str, ...]:
+    command = f"compgen -cdfa -- {shlex.quote(fragment)}"
+    lines = _compgen(command, _COMPGEN_LIMIT)
+    if lines is not None:
+        return tuple(lines)
+    try:
+        proc = subprocess.Popen(
+            ["bash", "-ic", command],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
         )
     except FileNotFoundError:
-        return []
+        return ()
+    candidates: dict[str, None] = {}
+    try:
+        for line in _iter_lines(proc.stdout.fileno(), _BASH_STARTUP_TIMEOUT):
+            if line:
+                candidates[os.fsdecode(line)] = None
+                if len(candidates) >= _COMPGEN_LIMIT:
+                    break
+    finally:
+        _kill_session(proc)
+    return tuple(candidates)
 
-    candidates = [line for line in result.stdout.splitlines() if line]
-    seen: set[str] = set()
-    completions: list[str] = []
-    for candidate in candidates:
-        full = lead + candidate
-        if full not in seen:
-            seen.add(full)
-            completions.append(full)
-    return completions
+
+def bash_completer(query: str) -> list[str]:
+    lead, fragment = _split_completion_query(query)
+    try:
+        candidates = _compgen_raw(fragment)
+    except TimeoutError:
+        return []
+    return list(dict.fromkeys(lead + candidate for candidate in candidates))
 
 
 class _PanelPromptSession:
+    _FOOTER = ("class:footer", "Tab: isi dari pilihan | Ctrl+C: batal")
+
     def __init__(
         self,
         prompt_text: str,
@@ -79,24 +307,60 @@ class _PanelPromptSession:
         completer: Optional[Callable[[str], Iterable[str]]] = None,
         style: Optional[Style] = None,
         max_rows: int = 6,
+        choice_index: Optional[_ChoiceIndex] = None,
     ) -> None:
         self.prompt_text = prompt_text
+        self._prompt_tuple = ("class:prompt", prompt_text)
         self.choices = list(choices) if choices is not None else None
+        if choice_index is None:
+            choice_index = _ChoiceIndex(self.choices or [])
+        self.choice_index = choice_index
         self.completer = completer
         self.style = style or DEFAULT_STYLE
         self.max_rows = max_rows
 
         self.panel_width = 46
         self.panel_inner_width = self.panel_width - 4
+        self._row_cache: dict[tuple[str, str], FormattedText] = {}
+        self._row_cache_width = self.panel_inner_width
 
-        self.input_text = ""
+        self._input_chars: list[str] = []
+        self._input_text_cache: Optional[str] = ""
+        self._input_tuple: Optional[tuple[str, str]] = None
         self.filtered_items: list[str] = []
         self.selected_index = 0
+        self._last_query = ""
+        self._last_result: list[_Entry] = []
+        self._has_more = False
+        self._render_cache_key: Optional[tuple] = None
+        self._render_cache_value: FormattedText = []
+        self._pending_filter: Optional[asyncio.TimerHandle] = None
 
         self.filter_items()
 
-    def filter_items(self) -> None:
+    @property
+    def input_text(self) -> str:
+        if self._input_text_cache is None:
+            self._input_text_cache = "".join(self._input_chars)
+        return self._input_text_cache
+
+    @input_text.setter
+    def input_text(self, value: str) -> None:
+        self._input_chars = list(value)
+        self._input_text_cache = value
+        self._input_tuple = None
+
+    def _input_changed(self) -> None:
+        self._input_text_cache = None
+        self._input_tuple = None
+
+    def filter_items(self, *, expand: bool = False) -> None:
+        if self._pending_filter is not None:
+            self._pending_filter.cancel()
+            self._pending_filter = None
         query = self.input_text
+        limit = None if expand else self.max_rows * 4
+        self._has_more = False
         if not query.strip():
             self.filtered_items = []
         elif self.completer is not None:
@@ -104,24 +368,93 @@ class _PanelPromptSession:
                 completions = list(self.completer(query))
             except Exception:
                 completions = []
-            self.filtered_items = [c for c in completions if c]
+            completions = [c for c in completions if c]
+            self.filtered_items = completions[:limit]
+            self._has_more = len(completions) > len(self.filtered_items)
         else:
             lowered = query.lower()
-            source = self.choices or []
-            self.filtered_items = [
-                item for item in source if lowered in item.lower()
-            ]
+            tokens = lowered.split()
+            index = self.choice_index
+            hits = None
+            if self._last_query and lowered.startswith(self._last_query):
+                hits = sorted(self._last_result)
+            elif limit is None:
+                hits = index.substring_hits(tokens)
+            if hits is not None:
+                matches = self._rank(hits, tokens, limit)
+            elif len(tokens) == 1:
+                matches = self._rank_prefixes(tokens[0], limit)
+            else:
+                matches = self._rank(index.entries, tokens, limit)
+            self.filtered_items = [choice for _, _, choice in matches]
+            if self._has_more:
+                self._last_query = ""
+            else:
+                self._last_query = lowered
+                self._last_result = matches
         self.selected_index = min(self.selected_index, max(len(self.filtered_items) - 1, 0))
 
-    @staticmethod
-    def _truncate(text: str, width: int) -> str:
-        if width <= 0:
-            return ""
-        if len(text) <= width:
-            return text
-        if width == 1:
-            return "…"
-        return text[: width - 1] + "…"
+    def _rank_prefixes(self, token: str, limit: Optional[int]) -> list[_Entry]:
+        entries = self.choice_index.entries
+        positions, total = self.choice_index.prefix_positions(token, limit)
+        matches = [entries[i] for i in positions]
+        if len(matches) < total:
+            self._has_more = True
+            return matches
+        remaining = None if limit is None else limit - len(matches)
+        return matches + self._take(
+            (entry for entry in entries if token in entry[1] and not entry[1].startswith(token)),
+            remaining,
+        )
+
+    def _rank(
+        self,
+        entries: list[_Entry],
+        tokens: list[str],
+        limit: Optional[int],
+    ) -> list[_Entry]:
+        head = tokens[0]
+        match = _all_tokens_matcher(tokens)
+        matches = self._take(
+            (entry for entry in entries if entry[1].startswith(head) and match(entry[1])),
+            limit,
+        )
+        if self._has_more:
+            return matches
+        remaining = None if limit is None else limit - len(matches)
+        return matches + self._take(
+            (entry for entry in entries if not entry[1].startswith(head) and match(entry[1])),
+            remaining,
+        )
+
+    def _take(self, candidates: Iterable[_Entry], limit: Optional[int]) -> list[_Entry]:
+        matches: list[_Entry] = []
+        for entry in candidates:
+            if len(matches) == limit:
+                self._has_more = True
+                break
+            matches.append(entry)
+        return matches
+
+    def _schedule_filter(self, app: Application) -> None:
+        if self.completer is None:
+            self.filter_items()
+            return
+        if self._pending_filter is not None:
+            self._pending_filter.cancel()
+        loop = asyncio.get_running_loop()
+        self._pending_filter = loop.call_later(_FILTER_DEBOUNCE, self._run_pending_filter, app)
+
+    def _run_pending_filter(self, app: Application) -> None:
+        self._pending_filter = None
+        if not app.is_running:
+            return
+        self.filter_items()
+        app.invalidate()
+
+    def _flush_filter(self) -> None:
+        if self._pending_filter is not None:
+            self.filter_items()
 
     def _panel_header(self, title: str) -> FormattedText:
         inner = f" {title} "
@@ -131,57 +464,73 @@ class _PanelPromptSession:
 
     def _panel_footer(self) -> FormattedText:
         line_len = self.panel_width - 2
-        return [("class:panel-border", f"└{'─' * line_len}┘\n")]
+        if self._has_more or len(self.filtered_items) > self.max_rows:
+            footer = " … ".center(line_len, "─")
+        else:
+            footer = "─" * line_len
+        return [("class:panel-border", f"└{footer}┘\n")]
 
     def _panel_row(self, text: str, style: str) -> FormattedText:
-        padded = text.ljust(self.panel_inner_width)
-        return [
-            ("class:panel-border", "│ "),
-            (style, padded),
-            ("class:panel-border", " │\n"),
-        ]
+        if self._row_cache_width != self.panel_inner_width:
+            self._row_cache.clear()
+            self._row_cache_width = self.panel_inner_width
+        key = (text, style)
+        row = self._row_cache.get(key)
+        if row is None:
+            if len(self._row_cache) >= _ROW_CACHE_SIZE:
+                self._row_cache.clear()
+            padded = text.ljust(self.panel_inner_width)
+            row = [
+                ("class:panel-border", "│ "),
+                (style, padded),
+                ("class:panel-border", " │\n"),
+            ]
+            self._row_cache[key] = row
+        return row
 
     def render_panel(self) -> FormattedText:
-        lines: FormattedText = []
+        max_rows = self.max_rows
+        inner_width = self.panel_inner_width
+        selected = self.selected_index
+        panel_row = self._panel_row
+        placeholder = panel_row("", "class:panel-placeholder")
 
         if not self.filtered_items:
-            lines.extend(self._panel_header("No results"))
-            message = self._truncate("Tidak ada hasil", self.panel_inner_width)
-            lines.extend(self._panel_row(message, "class:no-results"))
-
-            for _ in range(self.max_rows - 1):
-                lines.extend(self._panel_row("", "class:panel-placeholder"))
+            message = _truncate("Tidak ada hasil", inner_width)
+            rows = [self._panel_header("No results"), panel_row(message, "class:no-results")]
+            rows.extend([placeholder] * (max_rows - 1))
         else:
-            lines.extend(self._panel_header("Suggestions"))
-            suggestions = self.filtered_items[: self.max_rows]
-            for idx in range(self.max_rows):
-                if idx < len(suggestions):
-                    item = suggestions[idx]
-                    prefix = "› " if idx == self.selected_index else "  "
-                    content = prefix + self._truncate(
-                        item, self.panel_inner_width - len(prefix)
-                    )
-                    style = "class:selected-line" if idx == self.selected_index else "class:panel-line"
+            rows = [self._panel_header("Suggestions")]
+            suggestions = self.filtered_items[:max_rows]
+            for idx, item in enumerate(suggestions):
+                if idx == selected:
+                    prefix, style = "› ", "class:selected-line"
                 else:
-                    content = ""
-                    style = "class:panel-placeholder"
+                    prefix, style = "  ", "class:panel-line"
+                content = prefix + _truncate(item, inner_width - len(prefix))
+                rows.append(panel_row(content, style))
+            rows.extend([placeholder] * (max_rows - len(suggestions)))
 
-                lines.extend(self._panel_row(content, style))
-
-        lines.extend(self._panel_footer())
-        return lines
+        rows.append(self._panel_footer())
+        return list(chain.from_iterable(rows))
 
     def render_content(self) -> FormattedText:
-        parts: FormattedText = []
-        parts.append(("class:prompt", self.prompt_text))
-        parts.append(("class:input", self.input_text))
+        key = (self.input_text, self.selected_index, self.filtered_items, self._has_more)
+        if key == self._render_cache_key:
+            return self._render_cache_value
+
+        if self._input_tuple is None:
+            self._input_tuple = ("class:input", self.input_text)
+        parts: FormattedText = [self._prompt_tuple, self._input_tuple]
 
         if self.input_text:
             parts.append(("", "\n\n"))
             parts.extend(self.render_panel())
             parts.append(("", "\n"))
 
-        parts.append(("class:footer", "Tab: isi dari pilihan | Ctrl+C: batal"))
+        parts.append(self._FOOTER)
+        self._render_cache_key = key
+        self._render_cache_value = parts
         return parts
 
     def _accept_selection(self) -> None:
@@ -193,22 +542,30 @@ class _PanelPromptSession:
 
         @kb.add("up")
         def _(event) -> None:
+            self._flush_filter()
             if self.filtered_items and self.selected_index > 0:
                 self.selected_index -= 1
 
         @kb.add("down")
         def _(event) -> None:
+            self._flush_filter()
             if self.filtered_items and self.selected_index < len(self.filtered_items) - 1:
                 self.selected_index += 1
+            elif self._has_more:
+                self.filter_items(expand=True)
+                if self.selected_index < len(self.filtered_items) - 1:
+                    self.selected_index += 1
 
         @kb.add("tab")
         def _(event) -> None:
+            self._flush_filter()
             if self.filtered_items:
                 self._accept_selection()
                 self.filter_items()
 
         @kb.add("enter")
         def _(event) -> None:
+            self._flush_filter()
             text = self.input_text
             if not text and self.filtered_items:
                 text = self.filtered_items[self.selected_index]
@@ -216,29 +573,37 @@ class _PanelPromptSession:
 
         @kb.add("escape")
         def _(event) -> None:
-            self.input_text = ""
+            self._input_chars.clear()
+            self._input_changed()
+            self._last_query = ""
             self.filter_items()
 
         @kb.add("backspace")
         def _(event) -> None:
-            if self.input_text:
-                self.input_text = self.input_text[:-1]
-                self.filter_items()
+            if self._input_chars:
+                self._input_chars.pop()
+                self._input_changed()
+                self._last_query = ""
+                self._schedule_filter(event.app)
 
         @kb.add("c-u")
         def _(event) -> None:
-            self.input_text = ""
+            self._input_chars.clear()
+            self._input_changed()
+            self._last_query = ""
             self.filter_items()
 
         @kb.add("c-c")
         def _(event) -> None:
             event.app.exit(exception=KeyboardInterrupt)
 
-        for char in "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789.-_ ":
-            @kb.add(char)
-            def _(event, c=char) -> None:
-                self.input_text += c
-                self.filter_items()
+        @kb.add(Keys.Any)
+        def _(event) -> None:
+            char = event.key_sequence[-1].data
+            if char in _ALLOWED_CHARS:
+                self._input_chars.append(char)
+                self._input_changed()
+                self._schedule_filter(event.app)
 
         layout = Layout(
             Window(
@@ -287,6 +652,7 @@ class PanelInput:
         max_rows: int = 6,
     ) -> None:
         self._choices = list(choices) if choices is not None else DEFAULT_CHOICES[:]
+        self._choice_index = _ChoiceIndex(self._choices)
         self._completer = completer
         self._style = style or DEFAULT_STYLE
         self._max_rows = max_rows
@@ -298,6 +664,7 @@ class PanelInput:
     @choices.setter
     def choices(self, value: Iterable[str]) -> None:
         self._choices = list(value)
+        self._choice_index = _ChoiceIndex(self._choices)
 
     @property
     def style(self) -> Style:
@@ -307,6 +674,11 @@ class PanelInput:
     def style(self, value: Style) -> None:
         self._style = value
 
+    def _current_index(self) -> _ChoiceIndex:
+        if self._choice_index.choices != self._choices:
+            self._choice_index = _ChoiceIndex(self._choices)
+        return self._choice_index
+
     def prompt(self, prompt_text: str = "❯ ") -> str:
         session = _PanelPromptSession(
             prompt_text,
@@ -314,6 +686,7 @@ class PanelInput:
             self._completer,
             self._style,
             max_rows=self._max_rows,
+            choice_index=self._current_index(),
         )
         return session.run()
 
@@ -0,0 +1,314 @@
+import os
+import select
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from prompt_toolkit.application.current import create_app_session
+from prompt_toolkit.input import create_pipe_input
+from prompt_toolkit.output import DummyOutput
+
+import completebox
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _reset_bash() -> None:
+    completebox._close_bash()
+    completebox._BASH_PROC = None
+    completebox._BASH_FAILURES = 0
+    completebox._compgen_raw.cache_clear()
+
+
+def _baseline_filter(query: str, choices: list[str]) -> list[str]:
+    lowered = query.lower()
+    return [item for item in choices if lowered in item.lower()]
+
+
+def _filter(query: str, choices: list[str], **kwargs) -> list[str]:
+    session = completebox._PanelPromptSession("> ", choices)
+    session.input_text = query
+    session.filter_items(**kwargs)
+    return session.filtered_items
+
+
+class FilterItemsTest(unittest.TestCase):
+    def test_substring_matches_survive_prefix_hits(self) -> None:
+        choices = ["whatsapp", "com.whatsapp", "org.whatsapp"]
+        self.assertEqual(_filter("what", choices), choices)
+
+    def test_prefix_matches_rank_first(self) -> None:
+        choices = ["com.whatsapp", "whatsapp", "org.whatsapp", "whatever"]
+        self.assertEqual(
+            _filter("What", choices),
+            ["whatsapp", "whatever", "com.whatsapp", "org.whatsapp"],
+        )
+
+    def test_matches_same_choices_as_substring_scan(self) -> None:
+        choices = [f"{prefix}.{name}" for prefix in ("com", "org", "net") for name in completebox.DEFAULT_CHOICES]
+        for query in ("com", "android", "o", "x", "COM.W", "e.a"):
+            with self.subTest(query=query):
+                self.assertEqual(
+                    sorted(_filter(query, choices, expand=True)),
+                    sorted(_baseline_filter(query, choices)),
+                )
+
+    def test_tokens_must_all_match(self) -> None:
+        self.assertEqual(
+            _filter("android face", completebox.DEFAULT_CHOICES),
+            ["com.facebook.android"],
+        )
+        self.assertEqual(_filter("com  tok", completebox.DEFAULT_CHOICES), ["com.tiktok"])
+
+    def test_result_is_capped_until_expanded(self) -> None:
+        choices = [f"item{i}" for i in range(100)]
+        session = completebox._PanelPromptSession("> ", choices, max_rows=6)
+        session.input_text = "item"
+        session.filter_items()
+        self.assertEqual(session.filtered_items, choices[:24])
+        self.assertTrue(session._has_more)
+        session.filter_items(expand=True)
+        self.assertEqual(session.filtered_items, choices)
+        self.assertFalse(session._has_more)
+
+    def test_import_does_not_load_numpy(self) -> None:
+        code = "import sys, completebox; print('numpy' in sys.modules)"
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        self.assertEqual(result.stdout.strip(), "False")
+
+    def test_expanded_scan_agrees_with_and_without_numpy(self) -> None:
+        choices = [f"{name}.{i}" for i in range(100) for name in completebox.DEFAULT_CHOICES]
+        expected = _filter("co 1", choices, expand=True)
+        with mock.patch.object(completebox, "_numpy", lambda: None):
+            self.assertEqual(_filter("co 1", choices, expand=True), expected)
+        self.assertEqual(len(expected), len([c for c in choices if "co" in c.lower() and "1" in c]))
+
+    def test_blank_query_has_no_results(self) -> None:
+        self.assertEqual(_filter("   ", completebox.DEFAULT_CHOICES), [])
+
+
+class PanelInputTest(unittest.TestCase):
+    def prompt_filter(self, panel: completebox.PanelInput, query: str) -> list[str]:
+        def run(session: completebox._PanelPromptSession) -> list[str]:
+            session.input_text = query
+            session.filter_items()
+            return session.filtered_items
+
+        with mock.patch.object(completebox._PanelPromptSession, "run", run):
+            return panel.prompt()
+
+    def test_in_place_choice_edits_reach_the_filter(self) -> None:
+        panel = completebox.PanelInput(choices=["alpha"])
+        self.assertEqual(self.prompt_filter(panel, "bet"), [])
+        panel.choices.append("beta")
+        self.assertEqual(self.prompt_filter(panel, "bet"), ["beta"])
+        panel.choices[0] = "alphabet"
+        self.assertEqual(self.prompt_filter(panel, "bet"), ["beta", "alphabet"])
+
+    def test_index_is_reused_while_choices_are_unchanged(self) -> None:
+        panel = completebox.PanelInput(choices=["alpha", "beta"])
+        index = panel._choice_index
+        self.prompt_filter(panel, "a")
+        self.assertIs(panel._choice_index, index)
+        panel.choices = ["gamma"]
+        self.assertEqual(self.prompt_filter(panel, "gam"), ["gamma"])
+
+
+class NarrowingTest(unittest.TestCase):
+    choices = [f"{prefix}.{name}" for prefix in ("com", "org") for name in ("app", "papa", "map", "a.p")]
+
+    def type_query(self, session: completebox._PanelPromptSession, text: str) -> None:
+        for char in text:
+            session._input_chars.append(char)
+            session._input_changed()
+            session.filter_items()
+
+    def test_typed_refinement_matches_fresh_filter(self) -> None:
+        for query in ("a", "ap", "p", "a.", "org.p", "o p", "a p "):
+            with self.subTest(query=query):
+                session = completebox._PanelPromptSession("> ", self.choices)
+                self.type_query(session, query)
+                self.assertEqual(session.filtered_items, _filter(query, self.choices))
+
+    def test_refinement_only_rescans_previous_result(self) -> None:
+        session = completebox._PanelPromptSession("> ", self.choices)
+        self.type_query(session, "ma")
+        self.assertEqual(session._last_query, "ma")
+        previous = list(session._last_result)
+        self.type_query(session, "p")
+        self.assertTrue(set(session._last_result) <= set(previous))
+        self.assertEqual(session.filtered_items, ["com.map", "org.map"])
+
+    def test_truncated_result_is_not_cached(self) -> None:
+        session = completebox._PanelPromptSession("> ", [f"item{i}" for i in range(100)])
+        self.type_query(session, "item")
+        self.assertTrue(session._has_more)
+        self.assertEqual(session._last_query, "")
+        self.type_query(session, "9")
+        self.assertEqual(session.filtered_items, _baseline_filter("item9", [f"item{i}" for i in range(100)]))
+
+
+class DebounceTest(unittest.TestCase):
+    def run_prompt(self, completer, *steps: str) -> object:
+        result = {}
+        with create_pipe_input() as pipe:
+            def target() -> None:
+                with create_app_session(input=pipe, output=DummyOutput()):
+                    session = completebox._PanelPromptSession("> ", None, completer)
+                    result["value"] = session.run()
+
+            thread = threading.Thread(target=target)
+            thread.start()
+            time.sleep(0.2)
+            for step in steps:
+                pipe.send_text(step)
+                time.sleep(0.2)
+            thread.join(5)
+        self.assertFalse(thread.is_alive())
+        return result["value"]
+
+    def test_burst_calls_completer_once(self) -> None:
+        calls: list[str] = []
+
+        def completer(query: str) -> list[str]:
+            calls.append(query)
+            return [query + "-done"]
+
+        self.assertEqual(self.run_prompt(completer, "ech", "o\t\r"), "echo-done")
+        self.assertEqual(calls, ["ech", "echo", "echo-done"])
+
+    def test_enter_flushes_pending_filter(self) -> None:
+        calls: list[str] = []
+
+        def completer(query: str) -> list[str]:
+            calls.append(query)
+            return [query]
+
+        self.assertEqual(self.run_prompt(completer, "abc\r"), "abc")
+        self.assertEqual(calls, ["abc"])
+
+
+@unittest.skipUnless(shutil.which("bash"), "bash is required")
+class BashCompleterTest(unittest.TestCase):
+    def setUp(self) -> None:
+        _reset_bash()
+        self.home = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.home)
+        self.write_rc("alias cbxalias=ls\n")
+        env = mock.patch.dict(os.environ, {"HOME": self.home})
+        env.start()
+        self.addCleanup(env.stop)
+        self.addCleanup(_reset_bash)
+
+    def write_rc(self, text: str) -> None:
+        with open(os.path.join(self.home, ".bashrc"), "w") as rc:
+            rc.write(text)
+
+    def test_completes_aliases_from_rc(self) -> None:
+        self.assertEqual(completebox.bash_completer("cbxali"), ["cbxalias"])
+        self.assertEqual(completebox.bash_completer("echo cbxali"), ["echo cbxalias"])
+
+    def test_coprocess_is_reused(self) -> None:
+        completebox.bash_completer("cbxali")
+        proc = completebox._BASH_PROC
+        self.assertEqual(completebox._compgen("compgen -a -- cbx", 10), ["cbxalias"])
+        self.assertIs(completebox._BASH_PROC, proc)
+        self.assertIsNone(proc.poll())
+
+    def test_rc_output_is_drained(self) -> None:
+        self.write_rc("echo noise\nalias cbxalias=ls\n")
+        self.assertEqual(completebox.bash_completer("cbxali"), ["cbxalias"])
+
+    def test_queries_are_not_written_to_history(self) -> None:
+        self.write_rc("HISTFILE=$HOME/.cbx_history\nalias cbxalias=ls\n")
+        completebox.bash_completer("cbxali")
+        completebox.bash_completer("ech")
+        completebox._close_bash()
+        self.assertEqual(os.listdir(self.home), [".bashrc"])
+
+    def test_rc_partial_line_does_not_hide_sentinel(self) -> None:
+        self.write_rc('printf "\\033]0;title\\007"\nalias cbxalias=ls\n')
+        start = time.monotonic()
+        self.assertEqual(completebox.bash_completer("cbxali"), ["cbxalias"])
+        self.assertLess(time.monotonic() - start, completebox._BASH_STARTUP_TIMEOUT)
+        self.assertIsNone(completebox._BASH_PROC.poll())
+
+    def test_unresponsive_coprocess_is_discarded(self) -> None:
+        completebox.bash_completer("cbxali")
+        proc = completebox._BASH_PROC
+        with mock.patch.object(completebox, "_BASH_TIMEOUT", 0.2):
+            self.assertIsNone(completebox._compgen("sleep 5", 10))
+        self.assertIsNotNone(proc.poll())
+        completebox._compgen_raw.cache_clear()
+        self.assertEqual(completebox.bash_completer("cbxali"), ["cbxalias"])
+
+    def test_coprocess_respawns_once_after_discard(self) -> None:
+        with mock.patch.object(completebox, "_BASH_TIMEOUT", 0.2):
+            completebox.bash_completer("cbxali")
+            first = completebox._BASH_PROC
+            self.assertIsNone(completebox._compgen("sleep 5", 10))
+            self.assertIsNone(completebox._BASH_PROC)
+            self.assertEqual(completebox._compgen("compgen -a -- cbx", 10), ["cbxalias"])
+            second = completebox._BASH_PROC
+            self.assertIsNot(second, first)
+            self.assertIsNone(completebox._compgen("sleep 5", 10))
+        self.assertIs(completebox._BASH_PROC, second)
+        self.assertIsNone(completebox._compgen("compgen -a -- cbx", 10))
+        self.assertEqual(completebox.bash_completer("cbxali"), ["cbxalias"])
+
+    def test_hung_fallback_times_out(self) -> None:
+        self.write_rc("sleep 10\n")
+        with mock.patch.object(completebox, "_BASH_STARTUP_TIMEOUT", 0.3):
+            start = time.monotonic()
+            self.assertEqual(completebox.bash_completer("ech"), [])
+            self.assertLess(time.monotonic() - start, 3)
+        self.assertEqual(completebox._compgen_raw.cache_info().currsize, 0)
+
+    def test_close_ends_coprocess(self) -> None:
+        completebox.bash_completer("cbxali")
+        proc = completebox._BASH_PROC
+        completebox._close_bash()
+        self.assertIsNotNone(proc.poll())
+
+    @unittest.skipUnless(hasattr(os, "fork"), "pty requires fork")
+    def test_terminal_stays_in_foreground(self) -> None:
+        import pty
+
+        pid, fd = pty.fork()
+        if pid == 0:
+            try:
+                sys.path.insert(0, ROOT)
+                completebox.bash_completer("ec")
+                owned = os.tcgetpgrp(0) == os.getpgrp()
+                os.write(1, b"owned\n" if owned else b"lost\n")
+            finally:
+                os._exit(0)
+
+        output = b""
+        while select.select([fd], [], [], 30)[0]:
+            try:
+                chunk = os.read(fd, 1024)
+            except OSError:
+                break
+            if not chunk:
+                break
+            output += chunk
+        os.close(fd)
+        os.waitpid(pid, 0)
+        self.assertIn(b"owned", output)
+
+
+if __name__ == "__main__":
+    unittest.main()